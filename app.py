@@ -5,8 +5,12 @@ A Streamlit app to transform prestataire waste data to Urbyn format.
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
-from datetime import datetime
+import math
+import xlsxwriter
+from datetime import date, datetime
+from tempfile import SpooledTemporaryFile
 from etl_processor import ETLProcessor, SUPPORTED_PRESTATAIRES
 
 # Page config
@@ -16,6 +20,44 @@ st.set_page_config(
     layout="wide"
 )
 
+# Processor cache: mappings are only re-parsed when the uploaded files change
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_processor(etl_bytes, template_bytes):
+    """Load the ETL processor from the raw bytes of the configuration files"""
+    return ETLProcessor(io.BytesIO(etl_bytes), io.BytesIO(template_bytes))
+
+# Output writer: rows are streamed in order so xlsxwriter's constant_memory mode can flush them to disk
+def _write_blank(worksheet, row, col, token, *args):
+    return worksheet.write_blank(row, col, None)
+
+def _write_float(worksheet, row, col, token, *args):
+    return worksheet.write_blank(row, col, None) if math.isnan(token) else None
+
+def write_registre(df, output):
+    """Write the output registre row by row with xlsxwriter in constant-memory mode"""
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        'remove_timezone': True,
+    })
+    worksheet = workbook.add_worksheet('Registre des déchets (Mouvement')
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    
+    # Missing values become blank cells, plain dates keep a date-only format
+    for missing_type in (type(pd.NA), type(pd.NaT)):
+        worksheet.add_write_handler(missing_type, _write_blank)
+    for float_type in (float, np.float64):
+        worksheet.add_write_handler(float_type, _write_float)
+    worksheet.add_write_handler(
+        date, lambda ws, row, col, token, *args: ws.write_datetime(row, col, token, date_format)
+    )
+    
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], header_format)
+    for i, values in enumerate(df.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(i, 0, values)
+    workbook.close()
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -144,7 +186,7 @@ if st.button("🔄 Transform", type="primary", use_container_width=True):
         with st.spinner("Processing..."):
             try:
                 # Initialize processor
-                processor = ETLProcessor(etl_file, template_file)
+                processor = load_processor(etl_file.getvalue(), template_file.getvalue())
                 
                 # Detect prestataire if auto
                 if prestataire == "Auto-detect":
@@ -183,18 +225,18 @@ if st.button("🔄 Transform", type="primary", use_container_width=True):
                     st.subheader("📋 Preview (first 10 rows)")
                     st.dataframe(result['data'].head(10), use_container_width=True)
                     
-                    # Download button
-                    output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        result['data'].to_excel(writer, sheet_name='Registre des déchets (Mouvement', index=False)
-                    output.seek(0)
+                    # Download button (rows stream to a temp file, final archive spills to disk past 10 MB)
+                    with SpooledTemporaryFile(max_size=10 * 1024 * 1024) as output:
+                        write_registre(result['data'], output)
+                        output.seek(0)
+                        output_bytes = output.read()
                     
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     filename = f"{prestataire}_Registre_Agrege_{timestamp}.xlsx"
                     
                     st.download_button(
                         label="Download Output File",
-                        data=output,
+                        data=output_bytes,
                         file_name=filename,
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         use_container_width=True
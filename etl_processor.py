@@ -5,7 +5,13 @@ ETL Processor - Core transformation logic for all prestataires
 import pandas as pd
 import numpy as np
 import re
-from io import BytesIO
+import csv
+import ahocorasick
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from pandas.api.types import is_numeric_dtype, is_string_dtype
 
 # Supported prestataires
 SUPPORTED_PRESTATAIRES = [
@@ -145,6 +151,28 @@ PRESTATAIRE_CONFIG = {
     },
 }
 
+# Prestataire detection: one lookahead per prestataire, tried in config order
+_PRESTATAIRE_GROUPS = {
+    re.sub(r'\W', '_', name): name for name in PRESTATAIRE_CONFIG
+}
+_PRESTATAIRE_RE = re.compile('|'.join(
+    f"(?=.*?(?P<{group}>{PRESTATAIRE_CONFIG[name].get('pattern', name.lower())}))"
+    for group, name in _PRESTATAIRE_GROUPS.items()
+), re.DOTALL)
+
+# Input workbooks are only read, so openpyxl can stream them instead of building the full DOM
+EXCEL_READ_OPTIONS = {
+    "engine": "openpyxl",
+    "engine_kwargs": {"read_only": True, "data_only": True},
+}
+
+# CSV inputs are parsed into Arrow-backed columns (compact string buffers); the default
+# C engine is kept because it pads rows with missing trailing fields
+CSV_READ_OPTIONS = {
+    "encoding": "utf-8-sig",
+    "dtype_backend": "pyarrow",
+}
+
 # Paprec container mappings
 PAPREC_CONTAINER_VOLUMES = {
     'bac roulant 660l': 660, 'bac roulant 340l': 340, 'bac roulant 770l': 770,
@@ -168,10 +196,11 @@ class ETLProcessor:
         """Initialize with ETL and template files"""
         self.etl_file = etl_file
         self.template_file = template_file
-        self.warnings = []
         
-        # Load template
-        self.template_df = pd.read_excel(template_file, sheet_name=0, header=8)
+        # Load template column names only
+        self.template_cols = list(pd.read_excel(
+            template_file, sheet_name=0, header=8, nrows=0, **EXCEL_READ_OPTIONS
+        ).columns)
         
         # Load ETL mappings
         self._load_etl_mappings()
@@ -184,148 +213,210 @@ class ETLProcessor:
         # Paramètres sheet (Déchet fin → Déchets agrégé)
         param_df = pd.read_excel(self.etl_file, sheet_name='Paramètres')
         self.dechet_to_agrege = {}
-        for _, row in param_df[['Category', 'Name']].dropna().iterrows():
-            self.dechet_to_agrege[str(row['Name']).strip().lower()] = str(row['Category']).strip()
+        for category, name in param_df[['Category', 'Name']].dropna().itertuples(index=False, name=None):
+            self.dechet_to_agrege[str(name).strip().lower()] = str(category).strip()
+        self.dechet_to_agrege_s = pd.Series(self.dechet_to_agrege, dtype=object)
         
-        # Traitement générique sheet
+        # Traitement générique sheet, split into (agrégé, code) and agrégé-only lookups
         trait_df = pd.read_excel(self.etl_file, sheet_name='Traitement générique')
-        self.traitement_lookup = {}
-        for _, row in trait_df.iterrows():
-            key = str(row.get('Concatener déchet & code de traitement prestataire', '')).strip()
-            if key:
-                self.traitement_lookup[key] = {
-                    'code': row.get('Code traitement retraité'),
-                    'traitement': row.get('Traitement')
-                }
+        agreges = set(self.dechet_to_agrege.values())
+        self.traitement_by_pair = {}
+        self.traitement_by_agrege = {}
+        trait_rows = trait_df.reindex(columns=[
+            'Concatener déchet & code de traitement prestataire', 'Code traitement retraité', 'Traitement'
+        ])
+        for key, code_retraite, traitement in trait_rows.itertuples(index=False, name=None):
+            key = str(key).strip()
+            if not key:
+                continue
+            value = (code_retraite, traitement)
+            if key in agreges:
+                self.traitement_by_agrege[key] = value
+            for agrege in agreges:
+                code = key[len(agrege):]
+                if key.startswith(agrege) and code and code == code.strip():
+                    self.traitement_by_pair[(agrege, code)] = value
+        
+        columns = ['code', 'traitement']
+        self.traitement_by_pair_df = pd.DataFrame.from_dict(self.traitement_by_pair, orient='index', columns=columns)
+        self.traitement_by_agrege_df = pd.DataFrame.from_dict(self.traitement_by_agrege, orient='index', columns=columns)
         
         # Site sheet
         self.site_df = pd.read_excel(self.etl_file, sheet_name='Site')
     
     def detect_prestataire(self, filename):
         """Auto-detect prestataire from filename"""
-        filename_lower = filename.lower()
-        
-        for name, config in PRESTATAIRE_CONFIG.items():
-            pattern = config.get("pattern", name.lower())
-            if re.search(pattern, filename_lower):
-                return name
-        
-        return None
+        match = _PRESTATAIRE_RE.match(filename.lower())
+        return _PRESTATAIRE_GROUPS[match.lastgroup] if match else None
     
     def _get_dechet_mapping(self, prestataire_pattern):
-        """Get waste mappings for a prestataire"""
+        """Get waste mappings for a prestataire, indexed by normalized waste name"""
         mask = self.dechet_df['Nom prestataire (FORMULE)'].str.contains(
             prestataire_pattern, case=False, na=False
         )
         df_filtered = self.dechet_df[mask]
         
-        lookup = {}
-        default = None
+        rows = df_filtered.reindex(columns=['Nom des déchets prestataire', 'Nom des déchets Urbyn'])
+        prest_missing = rows['Nom des déchets prestataire'].isna()
+        urbyn_present = rows['Nom des déchets Urbyn'].notna()
         
-        for _, row in df_filtered.iterrows():
-            prest = row.get('Nom des déchets prestataire')
-            urbyn = row.get('Nom des déchets Urbyn')
-            
-            if pd.isna(prest):
-                if pd.notna(urbyn):
-                    default = urbyn
-            elif pd.notna(urbyn):
-                lookup[str(prest).strip().lower()] = urbyn
+        # Rows without a prestataire name give the default
+        defaults = rows.loc[prest_missing & urbyn_present, 'Nom des déchets Urbyn']
+        default = defaults.iloc[-1] if len(defaults) else None
         
-        return lookup, default
+        lookup = {}
+        for prest, urbyn in rows[~prest_missing & urbyn_present].itertuples(index=False, name=None):
+            lookup[str(prest).strip().lower()] = urbyn
+        
+        return pd.Series(lookup, dtype=object), default
     
     def _get_site_mapping(self, prestataire_pattern):
-        """Get site mappings for a prestataire"""
+        """Get site mappings for a prestataire, indexed by normalized site name"""
         mask = self.site_df['Nom prestataire (FORMULE)'].str.contains(
             prestataire_pattern, case=False, na=False
         )
         df_filtered = self.site_df[mask]
         
         lookup = {}
-        for _, row in df_filtered.iterrows():
-            site_prest = row.get('Nom site prestataire')
-            if pd.notna(site_prest):
-                key = str(site_prest).strip().lower()
-                lookup[key] = {
-                    'nom_site': row.get('Nom site Urbyn'),
-                    'code_prestation': row.get('Code de la prestation'),
-                    'prestataire': row.get('Nom prestataire (FORMULE)')
-                }
-        
-        return lookup
+        rows = df_filtered.reindex(columns=[
+            'Nom site prestataire', 'Nom site Urbyn', 'Code de la prestation', 'Nom prestataire (FORMULE)'
+        ]).dropna(subset=['Nom site prestataire'])
+        for site_prest, nom_site, code_prestation, prestataire in rows.itertuples(index=False, name=None):
+            key = str(site_prest).strip().lower()
+            lookup[key] = {
+                'nom_site': nom_site,
+                'code_prestation': code_prestation,
+                'prestataire': prestataire
+            }
+        
+        return pd.DataFrame.from_dict(
+            lookup, orient='index', columns=['nom_site', 'code_prestation', 'prestataire']
+        )
     
-    def _find_column(self, df, possible_names):
-        """Find a column by trying multiple possible names"""
+    def _find_column(self, normalized_columns, possible_names):
+        """Find a column by trying multiple possible names against lowercased column names"""
         for name in possible_names:
-            for col in df.columns:
-                if name.lower() in str(col).lower():
+            name_lower = name.lower()
+            for col_lower, col in normalized_columns:
+                if name_lower in col_lower:
                     return col
         return None
     
-    def _safe_get(self, row, column, default=None):
-        """Safely get a value from a row"""
+    def _safe_get(self, df, column, default=None):
+        """Safely get a column as a Series, filling missing values with default"""
         if column is None:
-            return default
-        try:
-            value = row.get(column)
-            return default if pd.isna(value) else value
-        except:
-            return default
+            return pd.Series(default, index=df.index, dtype=object)
+        values = df[column]
+        if default is None or not values.hasnans:
+            return values
+        
+        # Keep the column's own (Arrow-backed) dtype when it can hold the default
+        if isinstance(default, str):
+            fits = is_string_dtype(values.dtype)
+        else:
+            fits = is_numeric_dtype(values.dtype)
+        if not fits:
+            values = values.astype(object)
+        return values.fillna(default)
+    
+    def _truthy(self, values):
+        """Python truthiness of each value, using string kernels for string columns"""
+        if is_string_dtype(values.dtype) and values.dtype != object:
+            return values.ne('').fillna(False).astype(bool)
+        return values.astype(object).fillna(False).astype(bool)
+    
+    def _normalize(self, values):
+        """Normalize values to stripped lowercase strings for lookups"""
+        return values.astype('string').str.strip().str.lower()
     
     def _extract_code_site(self, nom_site):
         """Extract code site from nom site"""
-        if pd.isna(nom_site):
-            return None
-        nom_str = str(nom_site)
-        return nom_str.split(' - ')[0] if ' - ' in nom_str else None
+        nom_str = nom_site.dropna().astype(str)
+        code = nom_str.str.split(' - ').str[0].where(nom_str.str.contains(' - ', regex=False))
+        return code.reindex(nom_site.index)
+    
+    def _map_unique(self, values, mapper):
+        """Apply a Series mapper to the distinct values only, then broadcast back"""
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        mapped = mapper(pd.Series(uniques, dtype=values.dtype))
+        return mapped.take(codes).set_axis(values.index)
+    
+    def _map_container(self, container):
+        """Map Paprec container labels to volume and type"""
+        keys = self._normalize(container)
+        has_container = self._truthy(container)
+        return pd.DataFrame({
+            'volume': keys.map(PAPREC_CONTAINER_VOLUMES).where(has_container),
+            'type': keys.map(PAPREC_CONTAINER_TYPES).fillna('Equipement inconnu').where(has_container),
+        })
     
     def _map_dechet(self, dechet_prest, lookup, default):
         """Map waste type"""
-        if pd.isna(dechet_prest) or str(dechet_prest).strip() == '':
-            return default
-        key = str(dechet_prest).strip().lower()
-        return lookup.get(key, default)
+        text = dechet_prest.astype('string').str.strip()
+        mapped = text.str.lower().map(lookup)
+        return mapped.where(mapped.notna() & (text != ''), default)
     
     def _map_agrege(self, dechet_fin):
         """Map déchet fin to agrégé"""
-        if pd.isna(dechet_fin):
-            return None
-        return self.dechet_to_agrege.get(str(dechet_fin).strip().lower())
+        mapped = self._normalize(dechet_fin.dropna()).map(self.dechet_to_agrege_s)
+        return mapped.reindex(dechet_fin.index)
     
-    def _map_traitement(self, agrege, code=None):
-        """Map treatment"""
-        if pd.isna(agrege):
-            return None, None
-        
-        if pd.notna(code) and str(code).strip():
-            key = f"{agrege}{str(code).strip()}"
-            if key in self.traitement_lookup:
-                r = self.traitement_lookup[key]
-                return r['code'], r['traitement']
-        
-        if agrege in self.traitement_lookup:
-            r = self.traitement_lookup[agrege]
-            return r['code'], r['traitement']
-        
-        return None, None
+    def _map_traitement(self, agrege, code):
+        """Map treatment, trying (agrégé, code) first then agrégé alone, with the matched mask"""
+        agrege = agrege.dropna().astype(str)
+        code = code.reindex(agrege.index).astype(str).str.strip()
+        pairs = pd.MultiIndex.from_arrays([agrege, code])
+        by_pair = self.traitement_by_pair_df
+        by_agrege = self.traitement_by_agrege_df
+        
+        result = by_pair.reindex(pairs).set_axis(agrege.index)
+        fallback = by_agrege.reindex(agrege).set_axis(agrege.index)
+        found = pd.Series(pairs.isin(by_pair.index), index=agrege.index)
+        result = result.where(found, fallback, axis=0)
+        matched = found | agrege.isin(by_agrege.index)
+        return result['code'], result['traitement'], matched
     
     def _map_site(self, site_name, site_lookup):
-        """Map site with partial matching"""
-        if pd.isna(site_name):
-            return None
-        
-        key = str(site_name).strip().lower()
+        """Map site names to site lookup keys, with partial matching"""
+        keys = self._normalize(site_name)
         
         # Exact match
-        if key in site_lookup:
-            return site_lookup[key]
+        matched = keys.where(keys.isin(site_lookup.index))
         
-        # Partial match
-        for lookup_key, value in site_lookup.items():
-            if key in lookup_key or lookup_key in key:
-                return value
+        # Partial match, once per distinct unmatched name
+        partial = {}
+        missing = keys[matched.isna()].unique()
+        if len(missing) and len(site_lookup):
+            match_partial = self._build_site_matcher(list(site_lookup.index))
+            for key in missing:
+                partial[key] = match_partial(key)
         
-        return None
+        return matched.fillna(keys.map(partial))
+    
+    def _build_site_matcher(self, lookup_keys):
+        """Build a partial site matcher over the lookup keys, in lookup order"""
+        # Lookup keys contained in the site name: one Aho-Corasick scan
+        automaton = ahocorasick.Automaton()
+        for position, lookup_key in enumerate(lookup_keys):
+            if lookup_key:
+                automaton.add_word(lookup_key, position)
+        automaton.make_automaton()
+        
+        # Lookup keys containing the site name: first hit in the joined keys
+        haystack = '\x00'.join(lookup_keys)
+        starts = list(accumulate((len(k) + 1 for k in lookup_keys[:-1]), initial=0))
+        empty_position = lookup_keys.index('') if '' in lookup_keys else None
+        
+        def match_partial(key):
+            candidates = [position for _, position in automaton.iter(key)] if len(automaton) else []
+            offset = haystack.find(key)
+            if offset >= 0:
+                candidates.append(bisect_right(starts, offset) - 1)
+            if empty_position is not None:
+                candidates.append(empty_position)
+            return lookup_keys[min(candidates)] if candidates else None
+        
+        return match_partial
     
     def _read_file(self, file, prestataire):
         """Read input file based on prestataire config"""
@@ -333,54 +424,52 @@ class ETLProcessor:
         
         # Check if CSV
         if config.get("file_type") == "csv" or file.name.endswith('.csv'):
-            sep = config.get("csv_separator", ",")
-            # Try to detect separator
-            content = file.read()
+            # Detect separator from the start of the file
+            head = file.read(8192)
             file.seek(0)
-            
             try:
-                # Try semicolon first for Elise
-                df = pd.read_csv(BytesIO(content), sep=';', header=1, encoding='utf-8-sig')
-                if len(df.columns) > 5:
-                    return df
-            except:
-                pass
+                sample = head.decode('utf-8-sig', errors='replace')
+                sep = csv.Sniffer().sniff(sample, delimiters=';,\t').delimiter
+            except csv.Error:
+                sep = config.get("csv_separator", ",")
             
-            # Try comma
-            df = pd.read_csv(BytesIO(content), encoding='utf-8-sig')
-            return df
-        
-        # Excel file
-        xls = pd.ExcelFile(file)
-        
-        # Find the right sheet
-        sheet_name = 0
-        if 'sheet_patterns' in config:
-            for pattern in config['sheet_patterns']:
-                for sheet in xls.sheet_names:
-                    if pattern.lower() in sheet.lower():
-                        sheet_name = sheet
+            # Semicolon exports (Elise) have a title line above the header
+            header = 1 if sep == ';' else 0
+            return pd.read_csv(file, sep=sep, header=header, **CSV_READ_OPTIONS)
+        
+        # Excel file, opened once in streaming read-only mode
+        with pd.ExcelFile(file, **EXCEL_READ_OPTIONS) as xls:
+            # Find the right sheet
+            sheet_name = 0
+            if 'sheet_patterns' in config:
+                for pattern in config['sheet_patterns']:
+                    for sheet in xls.sheet_names:
+                        if pattern.lower() in sheet.lower():
+                            sheet_name = sheet
+                            break
+            elif 'registre' in [s.lower() for s in xls.sheet_names]:
+                sheet_name = 'registre'
+            
+            # Detect header row if needed
+            header_row = 0
+            if config.get("header_row_detection"):
+                book = xls.book
+                sheet = book[sheet_name] if isinstance(sheet_name, str) else book.worksheets[sheet_name]
+                # Ignore the stored <dimension> tag, which some exporters write as just "A1"
+                sheet.reset_dimensions()
+                for i, values in enumerate(sheet.iter_rows(max_row=15, values_only=True)):
+                    row_text = ' '.join([str(v).lower() for v in values if v is not None])
+                    if 'date' in row_text and ('poids' in row_text or 'kg' in row_text or 'matière' in row_text):
+                        header_row = i
                         break
-        elif 'registre' in [s.lower() for s in xls.sheet_names]:
-            sheet_name = 'registre'
-        
-        # Detect header row if needed
-        header_row = 0
-        if config.get("header_row_detection"):
-            df_raw = pd.read_excel(file, sheet_name=sheet_name, header=None, nrows=15)
-            for i, row in df_raw.iterrows():
-                row_text = ' '.join([str(v).lower() for v in row.values if pd.notna(v)])
-                if 'date' in row_text and ('poids' in row_text or 'kg' in row_text or 'matière' in row_text):
-                    header_row = i
-                    break
-            file.seek(0)
-        
-        df = pd.read_excel(file, sheet_name=sheet_name, header=header_row)
-        return df
+            
+            df = pd.read_excel(xls, sheet_name=sheet_name, header=header_row)
+        return df.convert_dtypes(dtype_backend='pyarrow')
     
     def process(self, files, prestataire):
         """Process files for a given prestataire"""
-        self.warnings = []
+        # Warnings are local to the run: the processor is shared across sessions
+        warnings = Counter()
         
         try:
             config = PRESTATAIRE_CONFIG.get(prestataire, {})
@@ -390,48 +479,36 @@ class ETLProcessor:
             dechet_lookup, default_dechet = self._get_dechet_mapping(pattern)
             site_lookup = self._get_site_mapping(pattern)
             
-            # Read and combine files
-            dfs = []
-            for f in files:
-                df = self._read_file(f, prestataire)
+            # Read files in parallel and combine
+            if not files:
+                raise ValueError("No files to process")
+            with ThreadPoolExecutor(max_workers=min(8, len(files))) as executor:
+                dfs = list(executor.map(lambda f: self._read_file(f, prestataire), files))
+            for f, df in zip(files, dfs):
                 df['_source_file'] = f.name
-                dfs.append(df)
             
             df_input = pd.concat(dfs, ignore_index=True) if len(dfs) > 1 else dfs[0]
             
             # Detect columns
             columns = config.get("columns", {})
+            normalized_columns = [(str(col).lower(), col) for col in df_input.columns]
             cols = {}
             for key, patterns in columns.items():
-                cols[key] = self._find_column(df_input, patterns)
-            
-            # Process rows
-            output_rows = []
-            skipped = 0
+                cols[key] = self._find_column(normalized_columns, patterns)
             
-            for _, row in df_input.iterrows():
-                result = self._process_row(row, cols, prestataire, config, 
-                                          dechet_lookup, default_dechet, site_lookup)
-                if result:
-                    output_rows.append(result)
-                else:
-                    skipped += 1
-            
-            # Create output DataFrame
-            df_output = pd.DataFrame(output_rows)
+            # Transform all rows at once
+            df_output, skipped = self._transform(df_input, cols, prestataire, config,
+                                                 dechet_lookup, default_dechet, site_lookup, warnings)
             
             # Align with template columns
-            for col in self.template_df.columns:
-                if col not in df_output.columns:
-                    df_output[col] = None
-            df_output = df_output[self.template_df.columns]
+            df_output = df_output.reindex(columns=self.template_cols)
             
             return {
                 'success': True,
                 'data': df_output,
                 'rows_processed': len(df_output),
                 'rows_skipped': skipped,
-                'warnings': self.warnings
+                'warnings': self._format_warnings(warnings)
             }
             
         except Exception as e:
@@ -441,75 +518,93 @@ class ETLProcessor:
                 'data': None,
                 'rows_processed': 0,
                 'rows_skipped': 0,
-                'warnings': self.warnings
+                'warnings': self._format_warnings(warnings)
             }
     
-    def _process_row(self, row, cols, prestataire, config, dechet_lookup, default_dechet, site_lookup):
-        """Process a single row"""
+    def _format_warnings(self, warnings):
+        """Format aggregated warnings, most frequent first"""
+        return [f"{msg} (×{count})" if count > 1 else msg for msg, count in warnings.most_common()]
+    
+    def _transform(self, df, cols, prestataire, config, dechet_lookup, default_dechet, site_lookup, warnings):
+        """Transform all input rows, returning the output DataFrame and skipped count"""
         
         # Get site
         site_col = cols.get('site') or cols.get('site_name') or cols.get('site_id')
-        site_name = self._safe_get(row, site_col, '')
-        site_info = self._map_site(site_name, site_lookup)
+        site_name = self._safe_get(df, site_col, '')
+        site_key = self._map_unique(site_name, lambda names: self._map_site(names, site_lookup))
+        
+        unmapped = site_key.isna()
+        for name, count in site_name[unmapped].value_counts(sort=False).items():
+            warnings[f"No site mapping for: '{name}'"] += count
         
-        if site_info is None:
-            self.warnings.append(f"No site mapping for: '{site_name}'")
-            site_info = {'nom_site': 'Site inconnu', 'code_prestation': None, 'prestataire': None}
+        site_info = site_lookup.reindex(site_key.to_numpy()).set_axis(df.index)
+        site_info.loc[unmapped, 'nom_site'] = 'Site inconnu'
         
         # Get waste
         waste_col = cols.get('waste') or cols.get('waste_name')
-        dechets_prest = self._safe_get(row, waste_col, '')
-        dechet_fin = self._map_dechet(dechets_prest, dechet_lookup, default_dechet)
-        dechets_agrege = self._map_agrege(dechet_fin)
+        dechets_prest = self._safe_get(df, waste_col, '')
+        dechet_fin = self._map_unique(
+            dechets_prest, lambda names: self._map_dechet(names, dechet_lookup, default_dechet)
+        )
+        dechets_agrege = self._map_unique(dechet_fin, self._map_agrege)
         
         # Get treatment
         code_col = cols.get('treatment_code') or cols.get('treatment_code_done')
-        code_prest = self._safe_get(row, code_col, '')
-        code_final, traitement = self._map_traitement(dechets_agrege, code_prest)
-        if code_final is None:
-            code_final = code_prest
+        code_prest = self._safe_get(df, code_col, '')
+        code_final, traitement, matched = self._map_traitement(dechets_agrege, code_prest)
+        matched = matched.reindex(df.index, fill_value=False)
+        code_final = code_final.reindex(df.index).where(matched, code_prest)
         
         # Get weight
         weight_col = cols.get('weight')
-        weight = self._safe_get(row, weight_col, 0)
+        if weight_col is None:
+            weight = pd.Series(0.0, index=df.index)
+        else:
+            # Plain float so Arrow NaN and <NA> are both filled below
+            raw_weight = df[weight_col]
+            weight = pd.to_numeric(raw_weight, errors='coerce').astype('float64')
+            invalid = weight.isna() & raw_weight.notna()
+            for value, count in raw_weight[invalid].value_counts(sort=False).items():
+                warnings[f"Invalid weight ignored: '{value}'"] += count
+            weight = weight.fillna(0)
         
         # Skip if no weight (for BSDD formats)
-        if config.get('bsdd_format') and (pd.isna(weight) or weight == 0):
-            return None
+        if config.get('bsdd_format'):
+            keep = weight != 0
+        else:
+            keep = pd.Series(True, index=df.index)
         
         # Convert weight
-        if weight:
-            weight = float(weight)
-            if config.get('weight_unit') == 'tonnes':
-                weight = weight * 1000
-        else:
-            weight = 0
+        if config.get('weight_unit') == 'tonnes':
+            weight = weight * 1000
         
         # Get date
-        date_col = cols.get('date')
-        date_val = self._safe_get(row, date_col)
+        date_val = self._safe_get(df, cols.get('date'))
         
         # Get other fields
-        bsd = self._safe_get(row, cols.get('bsd'))
-        waste_code = self._safe_get(row, cols.get('waste_code'))
-        transporter = self._safe_get(row, cols.get('transporter'))
-        exutoire = self._safe_get(row, cols.get('exutoire') or cols.get('destination'))
+        bsd = self._safe_get(df, cols.get('bsd'))
+        waste_code = self._safe_get(df, cols.get('waste_code'))
+        transporter = self._safe_get(df, cols.get('transporter'))
+        exutoire = self._safe_get(df, cols.get('exutoire') or cols.get('destination'))
         
         # Container info (for Paprec)
-        container = self._safe_get(row, cols.get('container'), '')
-        quantity = self._safe_get(row, cols.get('quantity') or cols.get('container_qty'), 1)
+        container = self._safe_get(df, cols.get('container'), '')
+        quantity = self._safe_get(df, cols.get('quantity') or cols.get('container_qty'), 1)
+        
+        volume_contenant = pd.Series(None, index=df.index, dtype=object)
+        type_contenant = pd.Series(None, index=df.index, dtype=object)
+        if prestataire == "Paprec":
+            container_info = self._map_unique(container, self._map_container)
+            volume_contenant = container_info['volume']
+            type_contenant = container_info['type']
         
-        volume_contenant = None
-        type_contenant = None
-        if container and prestataire == "Paprec":
-            container_lower = container.lower().strip()
-            volume_contenant = PAPREC_CONTAINER_VOLUMES.get(container_lower)
-            type_contenant = PAPREC_CONTAINER_TYPES.get(container_lower, 'Equipement inconnu')
+        volume_total = pd.to_numeric(volume_contenant) * pd.to_numeric(quantity, errors='coerce')
+        volume_total = volume_total.where(volume_total.fillna(0) != 0)
         
         # Determine prestataire name
-        prestataire_name = site_info.get('prestataire') or transporter or prestataire
+        prestataire_name = site_info['prestataire'].fillna(transporter).fillna(prestataire)
         
-        return {
+        df_output = pd.DataFrame({
             'Libellé': None,
             'Groupe': 'Capgemini',
             'Code site': self._extract_code_site(site_info['nom_site']),
@@ -517,7 +612,7 @@ class ETLProcessor:
             'Nom du client': 'CAPGEMINI TECHNOLOGY SERVICES',
             'Type de porteur': 'FM',
             'Commentaire mouvement': None,
-            'Code de la prestation': site_info.get('code_prestation'),
+            'Code de la prestation': site_info['code_prestation'],
             'Prestataire': prestataire_name,
             'Groupe de Prestataire': prestataire,
             'Type de prestataire': 'Privé',
@@ -527,16 +622,16 @@ class ETLProcessor:
             'Code déchet prestataire': waste_code,
             'Déchet fin': dechet_fin,
             'Déchets agrégé': dechets_agrege,
-            'Déchets prestataire': dechets_prest if dechets_prest else dechet_fin,
+            'Déchets prestataire': dechets_prest.where(self._truthy(dechets_prest), dechet_fin),
             'Masse totale (kg)': weight,
             'Nombre de contenants': quantity,
             'Volume contenant (L)': volume_contenant,
             'Type de contenant': type_contenant,
-            'Volume total (L)': volume_contenant * quantity if volume_contenant and quantity else None,
+            'Volume total (L)': volume_total,
             'Nature de quantités collectées': 'Masse',
             'Qualité quantités': 'Document prestataire',
             'Précision estimations des quantités': None,
-            'Traitement': traitement,
+            'Traitement': traitement.reindex(df.index),
             'Traitement prestataire': None,
             'Code traitement': code_final,
             'Code traitement prestataire': code_prest,
@@ -555,4 +650,6 @@ class ETLProcessor:
             'Période de clôture': None,
             'Statut du mouvement': 'Réalisée',
             'Commentaire': None,
-        }
+        }, index=df.index)
+        
+        return df_output[keep].reset_index(drop=True), int((~keep).sum())